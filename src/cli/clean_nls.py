@@ -1,17 +1,74 @@
 import ast
-import glob
 import lib.helpers as helpers
 import lib.nls as nls
 import logging
+import logging.handlers
+import multiprocessing
+import os
 import pandas as pd
 
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from pathlib import Path
 from typing import Any
 
+# Columns with few distinct values, stored as categories to save memory
+categorical_columns = ["type", "language", "format", "rights"]
+
 logger = logging.getLogger('')
 
 
+def _init_worker_logging(log_queue: Any, level: int) -> None:
+    """
+    Send a worker process's log records back to the main process, to be
+    written by its handlers. Spawned workers don't inherit those handlers,
+    and shouldn't open the log file themselves
+
+    :param log_queue: Queue read by a listener in the main process
+    :param level: Logging level of the main process' root logger
+    """
+    root = logging.getLogger('')
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+
+
+def process_file(file_path: Path, debug: bool) -> pd.DataFrame:
+    """
+    Read a single NLS data file into columnar format and clean its titles
+    and dates. Files are independent of each other, so when more than one
+    CPU is available this runs in a pool of worker processes
+
+    :param file_path: Path to the NLS data file
+    :param debug: if True then save intermediate stages out as tsv files
+    :return pd.DataFrame: Cleaned entries, indexed by file and row number
+    """
+    print(f"Processing: {file_path}")
+    # Create the debug folder once, rather than in every stage
+    out_dir = helpers.debug_dir(file_path) if debug else None
+    # `usecols` deals with the errant tabs at end of nls data files by
+    # dropping any fields past the 15 expected, which lets us use the
+    # C parser rather than truncating bad lines in python
+    df = pd.read_csv(file_path,
+                     sep='\t',
+                     engine='c',
+                     usecols=range(15),
+                     dtype=str)
+    return (df.pipe(nls.columnise_nls_data,  # type: ignore[call-overload]
+                    file_path=file_path,
+                    debug=debug,
+                    out_dir=out_dir)
+            .pipe(nls.add_file_data_to_index,
+                  file_path=file_path)
+            .pipe(helpers.clean_titles,
+                  file_path=file_path,
+                  debug=debug,
+                  out_dir=out_dir)
+            .pipe(nls.clean_nls_dates,
+                  file_path=file_path,
+                  debug=debug,
+                  out_dir=out_dir))
+
+
 def main(input_folder: str, output_folder: str, config_file: str, debug: bool,
          **kwargs: Any) -> None:
 
@@ -20,35 +77,45 @@ def main(input_folder: str, output_folder: str, config_file: str, debug: bool,
     registers: dict[str, int] = config["NLS"]["registers"]
     date_range: float = config["NLS"]["date_range"]
 
-    file_paths: list[Path] = list(map(Path, glob.glob(input_folder + '*.txt')))
+    # Skip hidden files, e.g. macOS '._' metadata files, as glob.glob does
+    file_paths: list[Path] = [path for path in Path(input_folder).glob('*.txt')
+                              if not path.name.startswith('.')]
     if len(file_paths) < 1:
         raise FileNotFoundError(f"No data found in {input_folder}")
     aggregate_path = Path(Path(input_folder).stem + '.tsv')
 
-    section_list = []
-
-    for file_path in file_paths:
-        print(f"Processing: {file_path}")
-        # `on_bad_lines` deals with the errant tabs at end of nls data files
-        df = pd.read_csv(file_path,
-                         sep='\t',
-                         engine='python',
-                         on_bad_lines=partial(lambda line: line[:15]))
-        df = (df.pipe(nls.columnise_nls_data,  # type: ignore[call-overload]
-                      file_path=file_path,
-                      debug=debug)
-              .pipe(nls.add_file_data_to_index,
-                    file_path=file_path))
-
-        section_list.append(df)
+    process = partial(process_file, debug=debug)
+    # Only count the CPUs this process may run on, which can be far fewer
+    # than the host has in a container
+    max_workers = min(len(file_paths), os.process_cpu_count() or 1)
+    if max_workers > 1:
+        # Spawn rather than fork, as the log listener thread is already
+        # running and forking a multi-threaded process can deadlock
+        context = multiprocessing.get_context('spawn')
+        log_queue = context.Queue()
+        listener = logging.handlers.QueueListener(log_queue,
+                                                  *logger.handlers,
+                                                  respect_handler_level=True)
+        listener.start()
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=context,
+                                     initializer=_init_worker_logging,
+                                     initargs=(log_queue,
+                                               logger.getEffectiveLevel())
+                                     ) as executor:
+                section_list = list(executor.map(process, file_paths))
+        finally:
+            listener.stop()
+    else:
+        # A single worker process would only add the cost of pickling the
+        # cleaned frames back to this one
+        section_list = list(map(process, file_paths))
     compiled_df: pd.DataFrame = pd.concat(section_list)
-
-    compiled_df = (compiled_df.pipe(helpers.clean_titles,
-                                    file_path=file_path,
-                                    debug=debug)
-                   .pipe(nls.clean_nls_dates,
-                         file_path=file_path,
-                         debug=debug))
+    # Convert column by column, as DataFrame.astype would copy the rest of
+    # the frame too
+    for column in categorical_columns:
+        compiled_df[column] = compiled_df[column].astype('category')
 
     print(f"Total No. of entries: {len(compiled_df)}")
 
@@ -1,7 +1,7 @@
 import logging
 import pandas as pd
 
-from lib.helpers import clean_titles
+from lib.helpers import clean_titles, debug_dir
 from pathlib import Path
 from typing import Any
 
@@ -31,7 +31,8 @@ def main(input_file: str, output_folder: str, debug: bool,
 
     df = df.rename(columns=rename_dict)
 
-    df = clean_titles(df, file_path, debug)
+    out_dir = debug_dir(file_path) if debug else None
+    df = clean_titles(df, file_path, debug, out_dir)
 
     required_columns: list[str] = list(rename_dict.values()) + additional_columns
     df = df.reindex(columns=required_columns)
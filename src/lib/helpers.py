@@ -1,7 +1,35 @@
+import numpy as np
 import pandas as pd
 import re
 
 from pathlib import Path
+from typing import cast
+
+_BRACKETS_RE = re.compile(r'\[(?:microform|illustrated|a novel|plates)\]')
+_EDITIONS_RE = re.compile(r'\b(?:n(?:os|)|ed|vol(?:s|ume|umes|))\b')
+_NUMBERS_RE = re.compile(r'\d{1,4}(?: *- *\d{1,4}|)')
+_MULTISPACE_RE = re.compile(r'\s{2,}')
+
+# Everything `remove_metadata` and `clean_title_string` do after removing the
+# bracket and edition metadata, as one alternation so the title is scanned
+# once. Editions stay a separate pass because a number range may span one
+# that has been removed, e.g. '1 - vol 2'
+_TITLE_RE = re.compile(
+    rf"(?P<number>{_NUMBERS_RE.pattern})"
+    r"|(?P<ampersand>&(?:amp;|))"
+    r"|(?P<apostrophe>['`])"
+    r"|(?P<separator>[^a-z0-9\d&'`]+)")
+_TITLE_REPLACEMENTS = {
+    'number': '',
+    'ampersand': 'and',
+    'apostrophe': '',
+    'separator': ' ',
+}
+
+# Titles without any of these characters or edition metadata only need
+# their separators replacing, which can skip the dispatch above
+_SPECIAL_CHARACTERS_RE = re.compile(r"[\d&'`\[]")
+_NON_ALPHANUMERIC_RE = re.compile(r'[^a-zA-Z0-9]+')
 
 
 def labelled_file(out_dir: Path, file_path: Path,
@@ -16,17 +44,26 @@ def labelled_file(out_dir: Path, file_path: Path,
     return out_dir / new_name
 
 
+def debug_dir(file_path: Path, out_dir: Path | None = None) -> Path:
+    """
+    Folder for the intermediate files saved when debugging an input file.
+    The cli scripts create it once per file and pass it through each stage
+    as `out_dir`, stages called without one create it themselves
+    """
+    if out_dir is None:
+        out_dir = file_path.parent.joinpath(file_path.stem + "_clean")
+        out_dir.mkdir(parents=True, exist_ok=True)
+    return out_dir
+
+
 def remove_metadata(title_string: str) -> str:
     """
     Remove strings and numbers not directly related to the title of the entry
     """
-    square_brackets_clean = re.sub(
-        r'\[(?:microform|illustrated|a novel|plates)\]', '',
-        title_string.lower())
-    editions_clean = re.sub(r'\b(?:n(?:os|)|ed|vol(?:s|ume|umes|))\b', '',
-                            square_brackets_clean)
-    no_numbers = re.sub(r'\d{1,4}(?: *- *\d{1,4}|)', '', editions_clean)
-    single_spaced = re.sub(r'\s{2,}', ' ', no_numbers)
+    square_brackets_clean = _BRACKETS_RE.sub('', title_string.lower())
+    editions_clean = _EDITIONS_RE.sub('', square_brackets_clean)
+    no_numbers = _NUMBERS_RE.sub('', editions_clean)
+    single_spaced = _MULTISPACE_RE.sub(' ', no_numbers)
     return single_spaced.strip()
 
 
@@ -34,35 +71,63 @@ def clean_title_string(title_string: str) -> str:
     """
     Remove/replace ampersands, apostrophes and multi-spaces
     """
-    no_ampersand = re.sub(r'(&amp;|&)', 'and', title_string)
-    no_apostrophe = re.sub(r"['`]", '', no_ampersand)
-    alphanum = re.sub(r'[^a-zA-Z0-9]', ' ', no_apostrophe)
-    single_spaced = re.sub(r'\s{2,}', ' ', alphanum)
-    return single_spaced.strip().lower()
+    # Plain substring replacement is quicker than a regex for these fixed
+    # strings. Apostrophes go after ampersands, as removing one first could
+    # join an '&amp;' together
+    no_ampersand = title_string.replace('&amp;', 'and').replace('&', 'and')
+    no_apostrophe = no_ampersand.replace("'", '').replace('`', '')
+    alphanum = _NON_ALPHANUMERIC_RE.sub(' ', no_apostrophe)
+    # Squeeze and strip the spaces as in `clean_title`
+    return ' '.join(alphanum.split()).lower()
+
+
+def _replace_title_match(match: re.Match) -> str:
+    # Every alternative in the title patterns is a named group
+    return _TITLE_REPLACEMENTS[cast(str, match.lastgroup)]
+
+
+def clean_title(title_string: str) -> str:
+    """
+    Remove metadata from a title and clean it with the precompiled patterns,
+    equivalent to `clean_title_string(remove_metadata(title_string))`
+    """
+    lowered = title_string.lower()
+    if (_SPECIAL_CHARACTERS_RE.search(lowered) is None
+            and _EDITIONS_RE.search(lowered) is None):
+        return ' '.join(_NON_ALPHANUMERIC_RE.sub(' ', lowered).split())
+
+    no_brackets = _BRACKETS_RE.sub('', lowered)
+    no_editions = _EDITIONS_RE.sub('', no_brackets)
+    if '&' in no_editions:
+        # Removing numbers can join up an '&amp;', e.g. '&1amp;', so they
+        # need to go before the ampersands are replaced
+        no_editions = _NUMBERS_RE.sub('', no_editions)
+    replaced = _TITLE_RE.sub(_replace_title_match, no_editions)
+    # Only single spaces are left as whitespace, so split/join squeezes runs
+    # of them and strips the ends
+    return ' '.join(replaced.split())
 
 
 def clean_titles(df: pd.DataFrame, file_path: Path,
-                 debug: bool) -> pd.DataFrame:
+                 debug: bool, out_dir: Path | None = None) -> pd.DataFrame:
     """
     Collecting the different title cleaning functions here
 
     :param df: The dataframe with uncleaned titles in columnar format
     :param file_path: File path of original data, to name debug output files
     :param debug: if True then save the dataframe out as a tsv file
+    :param out_dir: folder for debug files, created next to `file_path`
+                    if not given
     :return pd.DataFrame: The columnar dataframe
     """
-    clean_titles = (
-        df['title'].map(remove_metadata)
-        .map(clean_title_string)
-        .rename('clean_title')
-    )
-
-    df = pd.concat(
-        [clean_titles, df.loc[:, :]], axis=1)
+    # Reprints and editions repeat titles, so only clean each distinct title
+    # once and broadcast the results back to the rows
+    codes, titles = pd.factorize(df['title'], use_na_sentinel=False)
+    cleaned = np.array([clean_title(title) for title in titles], dtype=object)
+    df.insert(0, 'clean_title', cleaned[codes])
     if debug:
-        out_dir = file_path.parent.joinpath(file_path.stem + "_clean")
-        out_dir.mkdir(parents=True, exist_ok=True)
-        df.to_csv(labelled_file(out_dir, file_path, 'clean_titles', ".tsv"),
+        df.to_csv(labelled_file(debug_dir(file_path, out_dir), file_path,
+                                'clean_titles', ".tsv"),
                   sep='\t')
     return df
 
@@ -97,21 +162,25 @@ def format_library_set(df: pd.DataFrame,
     if any(duplicates):
         print(df[duplicates])
         raise IndexError("Duplicate indices found in dataframe")
-    df.index = df.index.map(lambda x: f'{source_library}:{x}')
-
-    df.index.names = ['id']
-    df['source_library'] = pd.Series([source_library] * df_len)
-    df['register'] = pd.Series([register_name] * df_len)
+    df.index = pd.Index(f'{source_library}:' + df.index.astype(str),
+                        name='id')
+
+    # Every entry shares the same library and register, so store each as a
+    # single category rather than one string per row
+    # NB the stubs only accept a sequence of codes, but an array saves
+    # building a list with one code per row
+    codes = np.zeros(df_len, dtype=np.int8)
+    df['source_library'] = pd.Categorical.from_codes(
+        codes,  # type: ignore[arg-type]
+        categories=pd.Index([source_library]))
+    df['register'] = pd.Categorical.from_codes(
+        codes,  # type: ignore[arg-type]
+        categories=pd.Index([register_name]))
 
     if register_name != "undated":
-        # NB manual type casting is required to avoid deprecation warnings and
-        # to get consistent output
-        df[["min_date", "max_date"]] = df[["min_date", "max_date"]].astype(object)
-        # NB using .loc[:,...] format to avoid runtime warning about ambiguity
-        # of making a copy/changing in place (we are making a copy)
-        df.loc[:, ["min_date", "max_date"]] = df.loc[:, ["min_date", "max_date"]].map(
-                    lambda x: pd.to_datetime(x, format='%Y', errors='coerce'))
-        df[["min_date", "max_date"]] = df[["min_date", "max_date"]].astype(
-           'datetime64[ns]')
+        df["min_date"] = pd.to_datetime(df["min_date"], format='%Y',
+                                        errors='coerce')
+        df["max_date"] = pd.to_datetime(df["max_date"], format='%Y',
+                                        errors='coerce')
 
     return df
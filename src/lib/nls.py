@@ -1,16 +1,27 @@
 import lib.helpers as helpers
 import logging
+import math
 import numpy as np
 import pandas as pd
 import re
 
 from pathlib import Path
+from typing import cast
 
 logger = logging.getLogger('')
 
+# Separate out different types of date in case they're relevant
+_DATES_RE = re.compile(r'(?:c(?:a\.?|irca|) ?(?P<circa_date>\d{4})|'
+                       r'(?P<question_date>\d{4})\?|'
+                       r'(?P<unqualified_date>\d{4}))')
+
+# Two digit file number at the end of NLS data file names, e.g. data_34.txt
+_FILE_ID_RE = re.compile(r'(\d{2})\.txt$')
+
 
 def columnise_nls_data(df: pd.DataFrame, file_path: Path,
-                       debug: bool) -> pd.DataFrame:
+                       debug: bool,
+                       out_dir: Path | None = None) -> pd.DataFrame:
     """
     Reformat data provided by National Library of Scotland.
     This is 'dictionary' style format, with tab separated sets of key-value
@@ -28,10 +39,12 @@ def columnise_nls_data(df: pd.DataFrame, file_path: Path,
     :param df: The dataframe in format provided by National Library of Scotland
     :param file_path: File path of original data, to name debug output files
     :param debug: if True then save the dataframe out as a tsv file
+    :param out_dir: folder for debug files, created next to `file_path`
+                    if not given
     :return pd.DataFrame: The columnar dataframe
     """
     # Strip out the data key, but leave other colons found in value
-    df = df.map(lambda x: ':'.join(x.split(':')[1:]))
+    df = df.map(lambda x: x.partition(':')[2])
     labels = [
         'title', 'creator', 'type', 'publisher', 'date', 'language', 'format',
         'relation', 'rights', 'identifier', 'description', 'subject',
@@ -39,10 +52,8 @@ def columnise_nls_data(df: pd.DataFrame, file_path: Path,
     ]
     df.columns = labels
     if debug:
-        out_dir = file_path.parent.joinpath(file_path.stem + "_clean")
-        out_dir.mkdir(parents=True, exist_ok=True)
-        df.to_csv(helpers.labelled_file(out_dir, file_path,
-                                        'columnar', ".tsv"),
+        df.to_csv(helpers.labelled_file(helpers.debug_dir(file_path, out_dir),
+                                        file_path, 'columnar', ".tsv"),
                   sep='\t')
     return df
 
@@ -66,16 +77,41 @@ def add_file_data_to_index(df: pd.DataFrame, file_path: Path):
     :rtype: pd.DataFrame
     """
     try:
-        prefix = re.search(r"(\d{2})\.txt", str(file_path)).group(1)
+        prefix = _FILE_ID_RE.search(file_path.name).group(1)
     except AttributeError:
         logger.warning(f"{file_path} not numbered, using full path as index prefix")
         prefix = file_path.stem
-    df.index = df.index.map(lambda x: f'{prefix}:{x}')
+    df.index = f'{prefix}:' + df.index.astype(str)
     return df
 
 
+def _reduce_dates(date_string: str) -> tuple[float, float, float, float]:
+    """
+    Scan a date string once for the first question and circa dates, and the
+    lowest and highest unqualified dates. Any not found are NaN
+    """
+    question = circa = min_uq = max_uq = math.nan
+    for match in _DATES_RE.finditer(date_string):
+        # Each alternative in the pattern is a named group
+        date_type = cast(str, match.lastgroup)
+        year = float(match[date_type])
+        if date_type == 'unqualified_date':
+            # NB comparisons with NaN are always False, so the first
+            # unqualified date replaces both placeholders
+            if not year >= min_uq:
+                min_uq = year
+            if not year <= max_uq:
+                max_uq = year
+        elif date_type == 'circa_date' and math.isnan(circa):
+            circa = year
+        elif date_type == 'question_date' and math.isnan(question):
+            question = year
+    return question, circa, min_uq, max_uq
+
+
 def clean_nls_dates(df: pd.DataFrame, file_path: Path,
-                    debug: bool) -> pd.DataFrame:
+                    debug: bool,
+                    out_dir: Path | None = None) -> pd.DataFrame:
     """
     Clean the dates of the National Library of Scotland dataset.
     The dates have multiple annotations e,g, c1983, circa 1983 etc.
@@ -86,79 +122,42 @@ def clean_nls_dates(df: pd.DataFrame, file_path: Path,
                National Library of Scotland
     :param file_path: File path of original data, to name debug files
     :param debug: if True then save the dataframe out as a tsv file
+    :param out_dir: folder for debug files, created next to `file_path`
+                    if not given
     :return pd.DataFrame: Cleaned entries
     """
 
-    # Separate out different types of date in case they're relevant
-    dates_re = (r'(?:c(?:a\.?|irca|) ?(?P<circa_date>\d{4})|'
-                r'(?P<question_date>\d{4})\?|'
-                r'(?P<unqualified_date>\d{4}))')
+    # Reduce the matches to one row per entry, entries without a date of a
+    # given type are left as NaN
+    processed_dates: np.ndarray = np.array(
+        [_reduce_dates(date_string) for date_string in df['date'].fillna('')],
+        dtype=np.float32).reshape(-1, 4)
+
+    # NB: Effectively ignoring different date types for now
+    # Just grab the min and max dates across all types, fmin/fmax skip NaNs
+    # without warning about entries that have no dates at all
+    date_loc = list(df.columns).index('date')
+    df.insert(date_loc + 1, 'min_date',
+              np.fmin.reduce(processed_dates, axis=1))
+    df.insert(date_loc + 2, 'max_date',
+              np.fmax.reduce(processed_dates, axis=1))
 
-    # create a dataframe of date matches with original index and match index
-    # and match index as a multi-index
-    dates_df = df['date'].str.extractall(dates_re).astype('float64')
     if debug:
-        out_dir = file_path.parent.joinpath(file_path.stem + "_clean")
-        out_dir.mkdir(parents=True, exist_ok=True)
+        out_dir = helpers.debug_dir(file_path, out_dir)
+        processed_df = pd.DataFrame(processed_dates,
+                                    index=df.index,
+                                    columns=['question_date', 'circa_date',
+                                             'min_uq_date', 'max_uq_date'])
+        # create a dataframe of date matches with original index and match
+        # index as a multi-index
+        dates_df = df['date'].str.extractall(_DATES_RE).astype('float32')
         dates_df.to_csv(
             helpers.labelled_file(out_dir, file_path, 'datetypes', ".tsv"),
             sep='\t',
         )
-
-    # Grab the question and circa dates with their original indices
-    question_dates: pd.Series = dates_df.pop('question_date').groupby(
-        level=0).first().dropna()
-
-    circa_dates: pd.Series = dates_df.pop('circa_date').groupby(level=0).first().dropna()
-
-    # Grab the unqualified dates with original indices into one series,
-    # if there are more than one, take the lowest
-    min_uq_dates: pd.Series = dates_df.groupby(level=0).min().rename(
-        columns={
-            'unqualified_date': 'min_uq_date'
-        }).dropna()
-
-    # Grab the unqualified dates with original indices into one series,
-    # if there are more than one, take the highest
-    max_uq_dates: pd.Series = dates_df.groupby(level=0).max().rename(
-        columns={
-            'unqualified_date': 'max_uq_date'
-        }).dropna()
-
-    # Make a new empty dataframe to hold the sorted dates data
-    # the new frame has the same size/index as the original
-    processed_dates = pd.DataFrame(
-        np.nan,
-        index=df.index,
-        columns=['question_date', 'circa_date', 'min_uq_date', 'max_uq_date'])
-
-    # Insert the various dates at their labelled indices
-    processed_dates.update(question_dates)
-    processed_dates.update(circa_dates)
-    processed_dates.update(min_uq_dates['min_uq_date'])
-    processed_dates.update(max_uq_dates['max_uq_date'])
-
-    # Make a new empty dataframe to hold the reduced dates data
-    # the new frame has the same size/index as the original
-    date_range = pd.DataFrame(np.nan,
-                              index=df.index,
-                              columns=['min_date', 'max_date'])
-
-    # NB: Effectively ignoring different date types for now
-    # Just grab the min and max dates across all types
-    date_range['min_date'] = processed_dates.min(axis=1)
-    date_range['max_date'] = processed_dates.max(axis=1)
-
-    df = pd.concat(  # type: ignore[call-overload]
-        [df.loc[:, :'date'], date_range, df.loc[:, 'language':]], axis=1)  # type: ignore[misc]
-
-    if debug:
-        out_dir: Path = file_path.parent.joinpath(file_path.stem + "_clean")
-        out_dir.mkdir(parents=True, exist_ok=True)
-        processed_dates.to_csv(helpers.labelled_file(out_dir, file_path,
-                                                     'processed_dates',
-                                                     ".tsv"),
-                               sep='\t')
+        processed_df.to_csv(helpers.labelled_file(out_dir, file_path,
+                                                  'processed_dates', ".tsv"),
+                            sep='\t')
         df.to_csv(helpers.labelled_file(out_dir, file_path, 'cleaned_dates',
                                         ".tsv"),
                   sep='\t')
@@ -182,14 +181,20 @@ def filter_nls_date(df: pd.DataFrame,
     """
 
     mod_year: float = date_range + 0.1  # Add 0.1 to escape rounding errors
+    # Build the mask from the raw arrays, avoiding intermediate Series
+    min_dates: np.ndarray = df['min_date'].to_numpy()
+    max_dates: np.ndarray = df['max_date'].to_numpy()
+    if filter_date is not None:
+        in_register = (((min_dates - mod_year) < filter_date)
+                       & ((max_dates + mod_year) > filter_date))
+    else:
+        in_register = np.isnan(min_dates) & np.isnan(max_dates)
+    # take() returns a new frame rather than a slice of df, so columns can be
+    # set on it without another copy or a SettingWithCopyWarning
+    register_df = df.take(np.flatnonzero(in_register))
     if filter_date is not None:
-        register_df = df.loc[((df['min_date'] - mod_year) < filter_date)
-                             & ((df['max_date'] + mod_year) > filter_date)]
         # Oh hey! A horrible hack! Apparently datetime64[ns] format has a
         # problem with dates before 1678
-        register_df.loc[:, 'min_date'] = register_df.loc[:, 'min_date'].map(
-            lambda d: 1678. if d < 1678. else d)
-    else:
-        register_df = df.loc[df['min_date'].isnull() & df['max_date'].isnull()]
+        register_df['min_date'] = register_df['min_date'].clip(lower=1678.)
 
-    return register_df.reindex()
+    return register_df
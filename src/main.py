@@ -9,17 +9,21 @@ from cli import clean_nls
 from cli import clean_register
 
 logger = logging.getLogger('')
-logging.basicConfig(level=logging.INFO,
-                    filename="promprint-data-wrangling.log",
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    filemode='w')
-
-console = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console.setFormatter(formatter)
 
 
 def main():
+    # Set up logging here rather than at import, so that worker processes
+    # which re-import this module don't truncate the log file. Their records
+    # are passed back to these handlers instead
+    logging.basicConfig(level=logging.INFO,
+                        filename="promprint-data-wrangling.log",
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        filemode='w')
+
+    console = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+
     parser = argparse.ArgumentParser(
         description="General scripts for cleaning promprint data")
     subparsers = parser.add_subparsers(help="Datasets to manipulate")
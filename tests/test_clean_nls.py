@@ -1,12 +1,17 @@
 import ast
 import glob
+import logging
 import numpy as np
+import os
 import pandas as pd
 import pytest
+import shutil
 
 from src.cli.clean_nls import main
 
 input_folder = "./tests/test_files/test_nls/"
+trailing_tabs_folder = "./tests/test_files/test_nls_trailing_tabs/"
+no_number_file = "./tests/test_files/test_nls_no_number/test_nls_sample.txt"
 config_file = "./tests/test_files/test_config.py"
 bad_config_file = "./tests/test_files/bad_test_config.py"
 wrong_keys_config_file = "./tests/test_files/wrong_keys_config.py"
@@ -61,3 +66,46 @@ def test_date_range_in_output(tmp_path):
     dates = map(lambda d: str(np.datetime64(d)), dates)
     date_set = set(pd.concat([df["min_date"], df["max_date"]]))
     assert all(date in date_set for date in dates)
+
+
+def test_trailing_tabs_ignored(tmp_path):
+    # N.B. Every entry in the trailing tabs file has 'text' as its type, so
+    # extra fields must not shift the columns
+    main(trailing_tabs_folder, tmp_path, one_register_config_file, False)
+    output = glob.glob(str(tmp_path) + '/*.tsv')[0]
+    df = pd.read_csv(output, sep='\t')
+    assert len(df) > 0
+    assert all(df["type"].str.strip() == "text")
+
+
+def test_hidden_files_ignored(tmp_path):
+    input_path = tmp_path / "input"
+    shutil.copytree(input_folder, input_path)
+    (input_path / "._test_nls_01.txt").write_bytes(b"\x00\x05\x16\x07")
+    main(str(input_path) + '/', tmp_path, one_register_config_file, False)
+    assert len(glob.glob(str(tmp_path) + '/*.tsv')) == 1
+
+
+def test_worker_warnings_logged_from_pool(tmp_path, monkeypatch, caplog):
+    # N.B. Force the process pool, whose spawned workers don't inherit this
+    # process' logging handlers
+    input_path = tmp_path / "input"
+    input_path.mkdir()
+    for name in ["first", "second", "third"]:
+        shutil.copy(no_number_file, input_path / f"{name}.txt")
+    monkeypatch.setattr(os, "process_cpu_count", lambda: 3)
+    caplog.set_level(logging.WARNING)
+    main(str(input_path) + '/', tmp_path, one_register_config_file, False)
+    warnings = [record for record in caplog.records
+                if "not numbered" in record.getMessage()]
+    assert len(warnings) == 3
+
+
+def test_pool_doesnt_fork_threaded_process(tmp_path, monkeypatch, recwarn):
+    # N.B. Forking once the log listener thread has started warns that the
+    # process is multi-threaded. The warning can't be turned into an error,
+    # so check what was recorded instead
+    monkeypatch.setattr(os, "process_cpu_count", lambda: 2)
+    main(input_folder, tmp_path, one_register_config_file, False)
+    assert not [warning for warning in recwarn
+                if "fork()" in str(warning.message)]
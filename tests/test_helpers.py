@@ -1,11 +1,15 @@
 import pandas as pd
 import pytest
 
-from src.lib.helpers import (clean_title_string, remove_metadata,
-                             labelled_file, format_library_set)
+from src.lib.helpers import (clean_title, clean_title_string, clean_titles,
+                             remove_metadata, labelled_file,
+                             format_library_set)
 from pathlib import Path
 from typing import List
 
+test_register_dir = Path("./tests/test_register/")
+test_register_csv = test_register_dir / "test_register.csv"
+
 
 def test_clean_title_string_lower_cases():
     input_string: str = "FRIENDS TO LOVERS"
@@ -63,6 +67,13 @@ def test_clean_title_string_replaces_ampersand_character():
     assert output_string == expected_string
 
 
+def test_clean_title_string_apostrophe_doesnt_join_ampersand_string():
+    input_string: str = "mills &'amp; boon"
+    expected_string: str = "mills andamp boon"
+    output_string: str = clean_title_string(input_string)
+    assert output_string == expected_string
+
+
 def test_remove_metadata_lower_cases():
     input_string: str = "FRIENDS TO LOVERS"
     expected_string: str = "friends to lovers"
@@ -84,46 +95,90 @@ def test_remove_metadata_strips_outer_whitespace():
     assert output_string == expected_string
 
 
-def test_remove_metadata_removes_square_bracket_metadata():
+@pytest.mark.parametrize("input_string", [
+    "second chance [microform]", "second chance [illustrated]",
+    "second chance [a novel]", "second chance [plates]"
+])
+def test_remove_metadata_removes_square_bracket_metadata(input_string):
+    expected_string: str = "second chance"
+    assert remove_metadata(input_string) == expected_string
+
+
+@pytest.mark.parametrize("input_string", [
+    "just my luck n 23", "just my luck ed 34", "just my luck vol 93",
+    "just my luck vols 190-321", "just my luck volume 38",
+    "just my luck volumes 23 - 34"
+])
+def test_remove_metadata_removes_volume_edition_metadata(input_string):
+    expected_string: str = "just my luck"
+    assert remove_metadata(input_string) == expected_string
+
+
+def test_clean_title_removes_metadata_and_cleans():
+    input_string: str = "Mills &amp; Boon's Tales [Plates] Vol 2"
+    expected_string: str = "mills and boons tales"
+    output_string: str = clean_title(input_string)
+    assert output_string == expected_string
+
+
+def test_clean_title_cleans_title_without_metadata():
+    input_string: str = " A Date, With  Death /"
+    expected_string: str = "a date with death"
+    output_string: str = clean_title(input_string)
+    assert output_string == expected_string
+
+
+def test_clean_title_matches_chained_cleaning():
     input_strings: List[str] = [
-        "second chance [microform]", "second chance [illustrated]",
-        "second chance [a novel]", "second chance [plates]"
+        "FRIENDS TO LOVERS", "\t\nkiller in shellview county \r",
+        "aÆ[date]/with/''\"\"£$%^*()-+_={}@~#!<>,?.death",
+        "second chance [a novel]", "just my luck volumes 23 - 34",
+        "mills & boon", "x[plates]ed", "a1 - vol 2b", "vol's 3&4",
+        "Don't &1amp; x"
+    ]
+    expected_strings: List[str] = [
+        clean_title_string(remove_metadata(s)) for s in input_strings
     ]
-    expected_strings: List[str] = ["second chance"] * 4
-    output_strings: List[str] = map(remove_metadata, input_strings)
+    output_strings: List[str] = map(clean_title, input_strings)
     assert list(output_strings) == expected_strings
 
 
-def test_remove_metadata_removes_volume_edition_metadata():
-    input_strings: List[str] = [
-        "just my luck n 23", "just my luck ed 34", "just my luck vol 93",
-        "just my luck vols 190-321", "just my luck volume 38",
-        "just my luck volumes 23 - 34"
+def test_clean_titles_cleans_repeated_titles():
+    titles: List[str] = [
+        "Mills &amp; Boon", "second chance [a novel]", "Mills &amp; Boon"
     ]
-    expected_strings: List[str] = ["just my luck"] * 6
-    output_strings: List[str] = map(remove_metadata, input_strings)
-    assert list(output_strings) == expected_strings
+    df = pd.DataFrame({"title": titles})
+    expected_titles: List[str] = list(map(clean_title, titles))
+    new_df = clean_titles(df, Path("titles.tsv"), False)
+    assert new_df.columns[0] == "clean_title"
+    assert list(new_df["clean_title"]) == expected_titles
+
+
+def test_clean_titles_debug_creates_output_folder(tmp_path):
+    df = pd.DataFrame({"title": ["Mills &amp; Boon"]})
+    file_path: Path = tmp_path / "titles.tsv"
+    clean_titles(df, file_path, True)
+    assert (tmp_path / "titles_clean" / "titles_clean_titles.tsv").exists()
+
+
+def test_clean_titles_debug_uses_given_output_folder(tmp_path):
+    df = pd.DataFrame({"title": ["Mills &amp; Boon"]})
+    file_path: Path = tmp_path / "titles.tsv"
+    clean_titles(df, file_path, True, tmp_path)
+    assert (tmp_path / "titles_clean_titles.tsv").exists()
+    assert not (tmp_path / "titles_clean").exists()
 
 
 def test_labelled_file_changes_ext():
-    input_filename: str = "./tests/test_register/test_register.csv"
-    input_path: Path = Path(input_filename)
-    out_dir = "./tests/test_register/"
-    out_path: Path = Path(out_dir)
-    expected_name: str = "./tests/test_register/test_register_labelled.tsv"
-    expected_path: Path = Path(expected_name)
-    assert labelled_file(out_path, input_path, "labelled",
+    expected_path: Path = test_register_dir / "test_register_labelled.tsv"
+    assert labelled_file(test_register_dir, test_register_csv, "labelled",
                          suffix=".tsv") == expected_path
 
 
 def test_labelled_file_doesnt_change_ext():
-    input_filename: str = "./tests/test_register/test_register.csv"
-    input_path: Path = Path(input_filename)
-    out_dir = "./tests/test_register/"
-    out_path: Path = Path(out_dir)
-    expected_name: str = "./tests/test_register/test_register_labelled.csv"
-    expected_path: Path = Path(expected_name)
-    assert labelled_file(out_path, input_path, "labelled") == expected_path
+    expected_path: Path = test_register_dir / "test_register_labelled.csv"
+    assert labelled_file(test_register_dir, test_register_csv,
+                         "labelled") == expected_path
 
 
 def test_new_index_added_to_formatted_library_set():
@@ -145,3 +200,22 @@ def test_duplicate_indices_raises():
                      index_col=0)
     with pytest.raises(IndexError):
         format_library_set(df, None, source_library, "1863b")
+
+
+def test_dates_converted_to_datetime_in_formatted_library_set():
+    df = pd.read_csv("./tests/test_files/nls_sample_filtered_1863b.tsv",
+                     sep='\t',
+                     index_col=0)
+    new_df = format_library_set(df, None, "NLS", "1863b")
+    expected_date = pd.Timestamp("1862-01-01")
+    assert new_df["min_date"].dtype == "datetime64[ns]"
+    assert new_df["min_date"].iloc[0] == expected_date
+
+
+def test_library_and_register_added_to_formatted_library_set():
+    df = pd.read_csv("./tests/test_files/nls_sample_filtered_1863b.tsv",
+                     sep='\t',
+                     index_col=0)
+    new_df = format_library_set(df, None, "NLS", "1863b")
+    assert all(new_df["source_library"] == "NLS")
+    assert all(new_df["register"] == "1863b")
@@ -1,39 +1,59 @@
-import glob
-import re
 import pandas as pd
+import pytest
 
 from pathlib import Path
-from src.lib.nls import add_file_data_to_index, columnise_nls_data
+from src.lib.nls import (_FILE_ID_RE, add_file_data_to_index,
+                         clean_nls_dates, columnise_nls_data)
 
 
-def test_file_id_prefix_added_to_index():
-    input_folder = "./tests/test_files/test_nls/"
-    file_path = Path(glob.glob(input_folder + '*.txt')[0])
+def columnised_sample(input_folder: str) -> tuple[pd.DataFrame, Path]:
+    file_path = next(Path(input_folder).glob('*.txt'))
     df = pd.read_csv(file_path, sep='\t')
-    df = columnise_nls_data(df, file_path, False)
+    return columnise_nls_data(df, file_path, False), file_path
+
+
+# The samples are only parsed once per module, so tests that modify them
+# should take a copy first
+@pytest.fixture(scope="module")
+def nls_sample() -> tuple[pd.DataFrame, Path]:
+    return columnised_sample("./tests/test_files/test_nls/")
+
+
+@pytest.fixture(scope="module")
+def nls_no_number_sample() -> tuple[pd.DataFrame, Path]:
+    return columnised_sample("./tests/test_files/test_nls_no_number/")
+
+
+def test_file_id_prefix_added_to_index(nls_sample):
+    df, file_path = nls_sample
+    df = df.copy()
     original_index = df.index
     df = add_file_data_to_index(df, file_path)
-    id = re.search(r"(\d{2})\.txt", str(file_path)).group(1)
-    updated = map(lambda x, y: x == f'{id}:{y}', df.index, original_index)
-    assert all(updated)
+    id = _FILE_ID_RE.search(file_path.name).group(1)
+    assert df.index.equals(f'{id}:' + original_index.astype(str))
 
 
-def test_no_file_number_falls_back_to_filename_as_id():
-    input_folder = "./tests/test_files/test_nls_no_number/"
-    file_path = Path(glob.glob(input_folder + '*.txt')[0])
-    df = pd.read_csv(file_path, sep='\t')
-    df = columnise_nls_data(df, file_path, False)
+def test_no_file_number_falls_back_to_filename_as_id(nls_no_number_sample):
+    df, file_path = nls_no_number_sample
+    df = df.copy()
     original_index = df.index
     df = add_file_data_to_index(df, file_path)
     id = "test_nls_sample"
-    updated = map(lambda x, y: x == f'{id}:{y}', df.index, original_index)
-    assert all(updated)
+    assert df.index.equals(f'{id}:' + original_index.astype(str))
 
 
-def test_essential_columns_present_after_columnise():
-    input_folder = "./tests/test_files/test_nls/"
-    file_path = Path(glob.glob(input_folder + '*.txt')[0])
-    df = pd.read_csv(file_path, sep='\t')
-    df = columnise_nls_data(df, file_path, False)
+def test_essential_columns_present_after_columnise(nls_sample):
+    df, _ = nls_sample
     essential_cols = {'title', 'creator', 'publisher', 'date'}
     assert essential_cols.issubset(set(df.columns))
+
+
+def test_min_and_max_dates_taken_across_date_types(nls_sample):
+    df, file_path = nls_sample
+    df = df.iloc[:3].copy()
+    df['date'] = [" c1850, 1862? 1860-1870", " [n.d.]", " ca. 1901?"]
+    df = clean_nls_dates(df, file_path, False)
+    assert df['min_date'].iloc[0] == 1850
+    assert df['max_date'].iloc[0] == 1870
+    assert df[['min_date', 'max_date']].iloc[1].isna().all()
+    assert df['min_date'].iloc[2] == df['max_date'].iloc[2] == 1901